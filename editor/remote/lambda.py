@@ -1,16 +1,28 @@
 
 """Email relay logic for the get help feature.
 
+Messages are sent with SES SendRawEmail so the execution role for this
+Lambda must allow the ses:SendRawEmail action (ses:SendEmail alone is not
+sufficient).
+
 License: BSD-3-Clause
 """
+import dataclasses
+import email.message
+import email.policy
 import json
 import os
 import typing
 
-import boto3
+import botocore.config
+import botocore.session
 
 AWS_DICT = typing.Dict[str, typing.Any]
 
+MAX_SIMULATION_LENGTH = 256 * 1024
+
+PAYLOAD_FIELDS = ('email', 'description', 'simulation')
+
 BODY_TEMPLATE = """
 Hello!
 
@@ -20,117 +32,99 @@ Thanks,
 HelpBot
 
 
-User email: {email}
+User email: %(email)s
 
 Description of issue:
-{description}
-
-----------------------------------------
-Simulation code:
-----------------------------------------
-{simulation}
-----------------------------------------
+%(description)s
 """
 
+SIMULATION_FILENAME = 'simulation.qta'
 
-class Payload:
-    """Represents the payload data for the help request email. """
-
-    def __init__(self, email: str, description: str, simulation: str):
-        """Create a Payload object with email, description, and simulation.
-
-        Args:
-            email (str): The user's email address.
-            description (str): The description of the issue.
-            simulation (str): The simulation code related to the issue.
-        """
-        self._email = email
-        self._description = description
-        self._simulation = simulation
-
-    def get_email(self) -> str:
-        """Get the user's email address.
+ATTACHMENT_NOTE = '\nSimulation code is attached as %s.\n' % (
+    SIMULATION_FILENAME
+)
 
-        Returns:
-            str: The user's email address.
-        """
-        return self._email
+_MESSAGE_POLICY = email.policy.SMTP.clone(cte_type='7bit')
 
-    def get_description(self) -> str:
-        """Get the description of the issue.
 
-        Returns:
-            str: The description of the issue.
-        """
-        return self._description
-
-    def get_simulation(self) -> str:
-        """Get the simulation code.
+@dataclasses.dataclass(slots=True, frozen=True)
+class Payload:
+    """Represents the payload data for the help request email.
 
-        Returns:
-            str: The simulation code.
-        """
-        return self._simulation
+    Attributes:
+        email (str): The user's email address.
+        description (str): The description of the issue.
+        simulation (str): The simulation code related to the issue.
+    """
+    email: str
+    description: str
+    simulation: str
 
 
+@dataclasses.dataclass(slots=True, frozen=True)
 class Config:
-    """Represents the configuration for sending emails."""
+    """Represents the configuration for sending emails.
 
-    def __init__(self, from_email: str, to_email: str, subject: str):
-        """Initialize the Config object with message metadata settings.
+    Attributes:
+        from_email (str): The from email address also used for return email.
+        to_email (str): The to email address (recipient of bug report).
+        subject (str): The subject line for the message (plaintext).
+    """
+    from_email: str
+    to_email: str
+    subject: str
 
-        Args:
-            from_email (str): The email from which the message should be sent.
-            to_email (int): The email to which the message should be sent.
-            subject (str): The subject line for the message.
-        """
-        self._from_email = from_email
-        self._to_email = to_email
-        self._subject = subject
 
-    def get_from_email(self) -> str:
-        """Get the from email address.
+def make_message(payload: Payload,
+                 config: Config) -> email.message.EmailMessage:
+    """Create an email message from the payload.
 
-        Returns:
-            str: The from email address also used for return email.
-        """
-        return self._from_email
+    Args:
+        payload (Payload): Payload class containing the user's email,
+            description of the issue, and simulation code.
+        config (Config): Config class containing the message metadata.
 
-    def get_to_email(self) -> str:
-        """Get the to email address.
+    Returns:
+        EmailMessage: Message with a short plaintext body and, if simulation
+            code was provided, that code as an attachment.
+    """
+    message = email.message.EmailMessage(policy=_MESSAGE_POLICY)
+    message['From'] = config.from_email
+    message['To'] = config.to_email
+    message['Subject'] = config.subject
+
+    body = BODY_TEMPLATE % {
+        'email': payload.email,
+        'description': payload.description
+    }
 
-        Returns:
-            int: The to email address (recipient of bug report).
-        """
-        return self._to_email
+    if not payload.simulation:
+        message.set_content(body)
+        return message
 
-    def get_subject(self) -> str:
-        """Get the subject line for the message.
+    message.set_content(body + ATTACHMENT_NOTE)
+    message.add_attachment(
+        payload.simulation,
+        subtype='plain',
+        filename=SIMULATION_FILENAME
+    )
 
-        Returns:
-            str: The subject line for the message (plaintext).
-        """
-        return self._subject
+    return message
 
 
-def make_message(payload: Payload) -> str:
-    """Create an email message from the payload.
+def has_valid_fields(data: AWS_DICT) -> bool:
+    """Determine if the payload fields in a parsed request are all strings.
 
     Args:
-        payload (Payload): Payload class containing the user's email,
-            description of the issue, and simulation code.
+        data (Dict[str, Any]): Dictionary parsed from the request body.
 
     Returns:
-        str: Message body rendered as a string.
+        bool: True if each payload field is a string or is missing / null and
+            false otherwise.
     """
-    sender = payload.get_email()
-    description = payload.get_description()
-    simulation = payload.get_simulation()
-
-    return BODY_TEMPLATE.format(
-        email=sender,
-        description=description,
-        simulation=simulation
+    return all(
+        isinstance(data.get(name), (str, type(None)))
+        for name in PAYLOAD_FIELDS
     )
 
 
@@ -142,13 +136,34 @@ def get_payload(data: typing.Dict[str, str]) -> Payload:
             simulation data.
 
     Returns:
-        Payload: Parsed payload.
+        Payload: Parsed payload where missing or non-string fields are empty.
     """
-    sender = data['email']
-    description = data['description']
-    simulation = data['simulation']
+    def get_str(name: str) -> str:
+        value = data.get(name)
+        return value if isinstance(value, str) else ''
+
+    return Payload(
+        get_str('email'),
+        get_str('description'),
+        get_str('simulation')
+    )
 
-    return Payload(sender, description, simulation)
+
+def get_required_env(name: str) -> str:
+    """Get an environment variable, failing if it is missing or empty.
+
+    Args:
+        name (str): The name of the environment variable.
+
+    Returns:
+        str: The value of the environment variable.
+    """
+    value = os.getenv(name)
+
+    if not value:
+        raise RuntimeError('Missing environment variable: %s' % name)
+
+    return value
 
 
 def get_config_from_env() -> Config:
@@ -158,40 +173,23 @@ def get_config_from_env() -> Config:
         Config: The configuration object containing metadata settings including
             sender and recipient addresses.
     """
-    from_email = os.getenv('HELP_EMAIL_FROM')
-    to_email = os.getenv('HELP_EMAIL_TO')
-    subject = os.getenv('HELP_EMAIL_SUBJECT')
+    from_email = get_required_env('HELP_EMAIL_FROM')
+    to_email = get_required_env('HELP_EMAIL_TO')
+    subject = get_required_env('HELP_EMAIL_SUBJECT')
 
     return Config(from_email, to_email, subject)
 
 
-def send_message(message: str, config: Config):
-    """Send an email message using the specified configuration.
+def send_message(message: email.message.EmailMessage, ses: typing.Any):
+    """Send an email message through SES.
 
     Args:
-        message (str): The email message to send as a string.
-        config (Config): Config class containing the SMTP configuration.
+        message (EmailMessage): The email message to send including headers.
+        ses: The SES client through which the message should be sent.
     """
-    ses = boto3.client('ses')
-
-    from_email = config.get_from_email()
-    to_email = config.get_to_email()
-    subject = config.get_subject()
-
-    response = ses.send_email(
-        Source=from_email,
-        Destination={
-            'ToAddresses': [to_email]
-        },
-        Message={
-            'Subject': {
-                'Data': subject
-            },
-            'Body': {
-                'Text': {
-                    'Data': message
-                }
-            }
+    response = ses.send_raw_email(
+        RawMessage={
+            'Data': message.as_bytes()
         }
     )
 
@@ -199,6 +197,30 @@ def send_message(message: str, config: Config):
         raise RuntimeError('Non-OK response from SES.')
 
 
+_SES = botocore.session.get_session().create_client(
+    'ses',
+    config=botocore.config.Config(tcp_keepalive=True)
+)
+_CONFIG = get_config_from_env()
+
+_HEADERS = {'Content-Type': 'application/json'}
+_OK_RESPONSE = {
+    'statusCode': 200,
+    'headers': _HEADERS,
+    'body': json.dumps({'message': 'Success'})
+}
+_INVALID_RESPONSE = {
+    'statusCode': 400,
+    'headers': _HEADERS,
+    'body': json.dumps({'message': 'Invalid help request'})
+}
+_TOO_LARGE_RESPONSE = {
+    'statusCode': 413,
+    'headers': _HEADERS,
+    'body': json.dumps({'message': 'Simulation too large'})
+}
+
+
 def lambda_handler(event: AWS_DICT, context: typing.Any) -> AWS_DICT:
     """Send emails on behalf of get_help.html
 
@@ -209,19 +231,21 @@ def lambda_handler(event: AWS_DICT, context: typing.Any) -> AWS_DICT:
     Returns:
         A response object indicating success or failure
     """
-    body = event.get('body', '{}')
-    data = json.loads(body)
+    body = event.get('body')
+    data = body if isinstance(body, dict) else json.loads(body or '{}')
+
+    if not isinstance(data, dict) or not has_valid_fields(data):
+        return _INVALID_RESPONSE
+
+    if len(data.get('simulation') or '') > MAX_SIMULATION_LENGTH:
+        return _TOO_LARGE_RESPONSE
 
     payload = get_payload(data)
-    config = get_config_from_env()
 
-    message = make_message(payload)
-    send_message(message, config)
+    if not payload.email.strip() or not payload.description.strip():
+        return _INVALID_RESPONSE
 
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json'
-        },
-        'body': json.dumps({'message': 'Success'})
-    }
+    message = make_message(payload, _CONFIG)
+    send_message(message, _SES)
+
+    return _OK_RESPONSE